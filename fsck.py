@@ -0,0 +1,330 @@
+import os
+import re
+import click
+import shutil
+import datetime
+import tempfile
+import numpy as np
+from tqdm import tqdm
+import multiprocessing
+from termcolor import colored
+
+from util import author_record_line_column_heads, format_author_record_line
+
+
+
+##############
+# RECORD SCAN
+##############
+
+def parse_dates(date_strs):
+    # parses an array of %Y-%m-%d date strings at once. returns the dates as days since epoch and a mask of valid dates.
+    # only falls back to parsing entry by entry if the array contains unparsable dates.
+    try:
+        dates = date_strs.astype('datetime64[D]')
+    except ValueError:
+        dates = np.array([parse_single_date(d) for d in date_strs], dtype='datetime64[D]')
+    # also reject anything which numpy parses but is not in the exact format written by create_extend_author_records
+    valid = ~np.isnat(dates) & (np.datetime_as_string(dates) == date_strs)
+    return dates.astype(np.int64), valid
+
+
+def parse_single_date(d):
+    try:
+        return np.datetime64(d, 'D')
+    except ValueError:
+        return np.datetime64('NaT')
+
+
+# longer numbers may exceed np.int64, and certainly are no citation counts
+MAX_COUNT_DIGITS = 18
+
+
+def is_count(values):
+    # checks an array of strings for non-negative integers which fit into np.int64.
+    return np.char.isdecimal(values) & (np.char.str_len(values) <= MAX_COUNT_DIGITS)
+
+
+# dates with missing zero padding, e.g. 2021-1-04
+UNPADDED_DATE = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')
+# the last field of a record glued to the date of the next record, e.g. 42021-01-07
+GLUED_DATE = re.compile(r'^(none|\d+)(\d{4}-\d{1,2}-\d{1,2})$')
+
+
+def split_glued_records(fields):
+    # splits the fields of a line containing two records, which have been written without a newline
+    # in between. returns the fields of both records, or None if the line is not of that form.
+    if len(fields) == 8:
+        return [fields[:4], fields[4:]]
+    if len(fields) == 7:
+        glued = GLUED_DATE.match(fields[3])
+        if glued:
+            return [fields[:3] + [glued.group(1)], [glued.group(2)] + fields[4:]]
+    return None
+
+
+def scan_author_record(text, repair=False):
+    """
+        Checks the content of an author record file for anything load_author_data and
+        desparsify_time_series_data do not expect. Returns a list of anomalies as tuples of
+        (line number, severity, kind, message), if repair is set and errors have been found
+        the content of the repaired file (or None, if the file can not be repaired), and the list of
+        the kinds of anomalies which prevent a repair, if any.
+        Anomalies of severity 'warning' are reported, but not repaired.
+    """
+    anomalies = []
+    blocking = [] # kinds of anomalies which can not be repaired without losing information
+    lines = text.split('\n')
+    # load_author_data strips leading whitespace before reading the header, so leading empty lines do no harm.
+    # skip them here as well and shift all line numbers accordingly below.
+    leading = 0
+    while leading < len(lines) - 1 and lines[leading].strip() == '':
+        leading += 1
+    lines = lines[leading:]
+    if lines[-1] == '':
+        lines = lines[:-1] # regular end of file
+    elif len(text) > 0:
+        # create_extend_author_records appends to files. a missing newline glues the next record to this line.
+        anomalies.append((len(lines), 'error', 'eof', 'missing newline at end of file'))
+
+    # (1) header: "# name, affiliation" followed by the column heads
+    column_header = '# {}'.format(author_record_line_column_heads())
+    name_header = lines[0] if len(lines) > 0 else ''
+    first_data_line = 2
+    if name_header.strip() == column_header:
+        anomalies.append((1, 'error', 'header', 'missing "# name, affiliation" header line'))
+        blocking.append('header')
+        first_data_line = 1
+    elif ',' not in name_header:
+        # load_author_data fails to split this into name and affiliation. there is no way to tell the name from here.
+        anomalies.append((1, 'error', 'header', 'expected "# name, affiliation" header, found "{}"'.format(name_header)))
+        blocking.append('header')
+    elif not name_header.strip().startswith('#'):
+        anomalies.append((1, 'error', 'header', 'header line is not marked as comment with "#"'))
+        name_header = '# {}'.format(name_header.strip())
+
+    if first_data_line == 2 and (len(lines) < 2 or lines[1].strip() != column_header):
+        if len(lines) > 1 and not lines[1].strip().startswith('#'):
+            # load_author_data skips the second line unseen. keep it as data.
+            first_data_line = 1
+            anomalies.append((2, 'error', 'header', 'missing column header line "{}". this record is skipped when loading'.format(column_header)))
+        else:
+            anomalies.append((2, 'error', 'header', 'expected column header line "{}"'.format(column_header)))
+
+    # (2) split into fields. only rows of four fields are processed further.
+    # lines containing two records glued together are split up again, empty lines are dropped.
+    rows = []
+    line_numbers = []
+    for ln, l in enumerate(lines[first_data_line::], start=first_data_line + 1):
+        fields = l.split()
+        if len(fields) == 4:
+            rows.append(fields)
+            line_numbers.append(ln)
+            continue
+
+        glued = split_glued_records(fields)
+        if glued:
+            anomalies.append((ln, 'error', 'malformed', 'two records without newline in between: "{}"'.format(l)))
+            rows.extend(glued)
+            line_numbers.extend([ln] * len(glued))
+        elif len(fields) == 0:
+            anomalies.append((ln, 'error', 'malformed', 'empty line'))
+        else:
+            anomalies.append((ln, 'error', 'malformed', 'expected "{}", found "{}"'.format(author_record_line_column_heads(), l)))
+            blocking.append('malformed')
+
+    table = np.array(rows, dtype=str).reshape(-1, 4)
+    line_numbers = np.array(line_numbers, dtype=int)
+
+    # (3) parse and check all fields at once.
+    dates, date_valid = parse_dates(table[:, 0])
+    if not date_valid.all():
+        # make room for zero-padded dates, then try to pad the invalid ones
+        table = table.astype('<U{}'.format(max(table.dtype.itemsize // np.dtype('U1').itemsize, 10)))
+        for i in np.where(~date_valid)[0]:
+            unpadded = UNPADDED_DATE.match(table[i, 0])
+            if not unpadded:
+                continue
+            padded = '{}-{:0>2}-{:0>2}'.format(*unpadded.groups())
+            padded_date, padded_valid = parse_dates(np.array([padded]))
+            if padded_valid[0]:
+                anomalies.append((int(line_numbers[i]), 'error', 'value', 'invalid date "{}", should be "{}"'.format(table[i, 0], padded)))
+                table[i, 0] = padded
+                dates[i] = padded_date[0]
+                date_valid[i] = True
+    citations_valid = is_count(table[:, 1])
+    h_none = table[:, 2] == 'none'
+    i10_none = table[:, 3] == 'none'
+    h_valid = is_count(table[:, 2]) | h_none
+    i10_valid = is_count(table[:, 3]) | i10_none
+    for valid, field in [(date_valid, 'date'), (citations_valid, 'citations'), (h_valid, 'hindex'), (i10_valid, 'i10index')]:
+        column = ['date', 'citations', 'hindex', 'i10index'].index(field)
+        for ln, v in zip(line_numbers[~valid], table[~valid, column]):
+            anomalies.append((int(ln), 'error', 'value', 'invalid {} "{}"'.format(field, v)))
+            blocking.append('value')
+
+    valid = date_valid & citations_valid & h_valid & i10_valid
+    table, dates, line_numbers = table[valid], dates[valid], line_numbers[valid]
+    h_none, i10_none = h_none[valid], i10_none[valid]
+    citations = table[:, 1].astype(np.int64)
+    if dates.size == 0:
+        # desparsify_time_series_data needs at least one record to work with.
+        anomalies.append((first_data_line + 1, 'error', 'empty', 'no valid records'))
+        blocking.append('empty')
+
+    # (4) check the time series.
+    # duplicates: any later record of an already recorded date.
+    unique_dates, first_index = np.unique(dates, return_index=True)
+    duplicate = np.ones(dates.size, dtype=bool)
+    duplicate[first_index] = False
+    for i in np.where(duplicate)[0]:
+        first = first_index[np.searchsorted(unique_dates, dates[i])]
+        anomalies.append((int(line_numbers[i]), 'error', 'duplicate', 'date {} already recorded in line {}'.format(table[i, 0], line_numbers[first])))
+
+    # order: records of dates earlier than any previously recorded date.
+    if dates.size > 0:
+        latest = np.maximum.accumulate(dates)
+        out_of_order = np.concatenate([[False], dates[1:] < latest[:-1]]) & ~duplicate
+        for i in np.where(out_of_order)[0]:
+            anomalies.append((int(line_numbers[i]), 'error', 'order', 'date {} recorded after date {}'.format(table[i, 0], np.datetime64(int(latest[i-1]), 'D'))))
+
+    # placeholders: "none" is written for the past years' preamble. anywhere after actual values it is read as a drop to 0.
+    for none, field in [(h_none, 'hindex'), (i10_none, 'i10index')]:
+        seen_values = np.concatenate([[False], np.logical_or.accumulate(~none)[:-1]])
+        for ln in line_numbers[none & seen_values]:
+            anomalies.append((int(ln), 'error', 'none', '"none" placeholder for {} after recorded values'.format(field)))
+
+    # decreasing citations. this happens on google scholar's side every now and then, so it only is a warning.
+    decreasing = np.where(citations[1:] < citations[:-1])[0] + 1
+    for i in decreasing:
+        anomalies.append((int(line_numbers[i]), 'warning', 'decreasing', 'citations decrease from {} (line {}) to {}'.format(citations[i-1], line_numbers[i-1], citations[i])))
+
+    if leading > 0:
+        anomalies = [(ln + leading, severity, kind, message) for ln, severity, kind, message in anomalies]
+        anomalies.append((1, 'warning', 'header', '{} empty line(s) before the header'.format(leading)))
+    anomalies.sort(key=lambda x: x[0])
+    if blocking or not (repair and any(a[1] == 'error' for a in anomalies)):
+        return anomalies, None, blocking
+
+    # (5) repair: keep the last record per date in order of dates,
+    # and fill in "none" placeholders after recorded values from the previous record.
+    _, last_index = np.unique(dates[::-1], return_index=True)
+    keep = dates.size - 1 - last_index # np.unique sorts by date
+    table = table[keep]
+    for column in [2, 3]:
+        none = table[:, column] == 'none'
+        previous = np.maximum.accumulate(np.where(~none, np.arange(none.size), -1))
+        table[:, column] = np.where(previous >= 0, table[previous, column], table[:, column])
+
+    repaired = [name_header, column_header] + [format_author_record_line(*row) for row in table]
+    return anomalies, '\n'.join(repaired) + '\n', blocking
+
+
+def file_signature(stat):
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def write_atomically(path, text, signature):
+    # writes text to a temporary file next to path first, then replaces path by it, such that
+    # readers (or an interrupted run) never see a partially written file.
+    # path is only replaced if its signature still matches the given one, i.e. if nobody (e.g. main.py)
+    # has written to it since it has been read. returns whether path has been replaced.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wt') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(path, tmp_path)
+        if file_signature(os.stat(path)) != signature:
+            os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, path)
+        return True
+    except:
+        os.remove(tmp_path)
+        raise
+
+
+def check_author_record(args):
+    # checks (and optionally repairs) a single author record file. executed by the worker processes.
+    # returns the file path, the list of anomalies, whether the file has been repaired
+    # and the kinds of anomalies which prevent a repair.
+    path, repair = args
+    try:
+        with open(path) as f:
+            signature = file_signature(os.fstat(f.fileno()))
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return path, [(0, 'error', 'read', str(e))], False, ['read']
+
+    try:
+        anomalies, repaired, blocking = scan_author_record(text, repair=repair)
+        if repaired is not None:
+            if write_atomically(path, repaired, signature):
+                return path, anomalies, True, blocking
+            anomalies.append((0, 'error', 'changed', 'file changed during the check. not repaired, please check again'))
+            return path, anomalies, False, blocking + ['changed']
+        return path, anomalies, False, blocking
+    except Exception as e:
+        # report whatever went wrong for this file, instead of aborting the check of all other files.
+        return path, [(0, 'error', 'internal', '{}: {}'.format(type(e).__name__, e))], False, ['internal']
+
+
+
+
+##############
+# ENTRY POINT
+##############
+
+@click.command()
+@click.option('--author_record_dir' , '-ad' , default='./output/authors/'   , help="Should point at the folder containing all the pre-collected author data.")
+@click.option('--repair'            , '-r'  , is_flag=True                  , help="Set this flag to rewrite files with errors in a repaired form. Records glued together are split, dates are zero-padded, empty lines are dropped, records are sorted by date, the last record per date is kept and 'none' placeholders after recorded values are filled in. Files with records which can not be recovered are left untouched. Files are replaced atomically.")
+@click.option('--errors_only'       , '-e'  , is_flag=True                  , help="Set this flag to only report errors, i.e. to not report warnings such as decreasing citations.")
+@click.option('--workers'           , '-j'  , default=multiprocessing.cpu_count(), help="Number of worker processes to scan files with.")
+def fsck(author_record_dir, repair, errors_only, workers):
+    """
+        This script checks all (already downloaded) author records on the disc for anomalies,
+        such as malformed headers or records, duplicate or out-of-order dates, misplaced 'none'
+        placeholders and decreasing citation counts, and optionally repairs them.
+    """
+
+    # announce current time
+    tqdm.write(colored('Data integrity check starting at {}'.format(datetime.datetime.now()), 'green'))
+
+    author_files = sorted([os.path.join(author_record_dir, x) for x in os.listdir(author_record_dir) if os.path.isfile(os.path.join(author_record_dir, x)) and x.endswith('.txt')])
+    jobs = [(a, repair) for a in author_files]
+    with multiprocessing.Pool(workers) as workerpool:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        results = [r for r in tqdm(workerpool.imap_unordered(check_author_record, jobs, chunksize=chunksize), unit=' files', postfix='checking author records', total=len(jobs))]
+
+    # report all anomalies by file and line
+    n_errors = n_warnings = 0
+    unrepaired = []
+    for path, anomalies, repaired, blocking in sorted(results):
+        for line, severity, kind, message in anomalies:
+            if severity == 'error':
+                n_errors += 1
+                tqdm.write(colored('{}:{}: [{}] {}'.format(path, line, kind, message), 'red'))
+            elif not errors_only:
+                n_warnings += 1
+                tqdm.write(colored('{}:{}: [{}] {}'.format(path, line, kind, message), 'yellow'))
+        if repaired:
+            tqdm.write(colored('Repaired "{}"'.format(path), 'green'))
+        elif any(a[1] == 'error' for a in anomalies):
+            unrepaired.append(path)
+            if repair and 'read' in blocking:
+                tqdm.write(colored('ERROR! "{}" can not be read.'.format(path), 'red'))
+            elif repair and 'changed' in blocking:
+                tqdm.write(colored('ERROR! "{}" has been written to during the check. Please run the check again.'.format(path), 'red'))
+            elif repair:
+                hint = 'Please fix the header manually.' if set(blocking) == {'header'} else 'Please fix the reported errors manually.'
+                tqdm.write(colored('ERROR! "{}" can not be repaired automatically. {}'.format(path, hint), 'red'))
+
+    tqdm.write('Checked {} files: {} errors, {} warnings.'.format(len(results), n_errors, n_warnings))
+    if unrepaired:
+        exit(1)
+
+
+if __name__ == '__main__':
+    fsck()
@@ -77,75 +77,12 @@ def plot(authors, author_list, author_record_dir, output_file, list, show, what,
     #print(len(author_data[0]['date_str']))
     #print(len(np.unique(author_data[0]['date_str'])))
 
-    # select desired measurements as values to be visualized ("what")
-    for a in author_data:
-        a['value'] = a[whats_keys[what]]
-
-    # process values as desired ("how")
-    for a in author_data:
-        a['value'] = process_values(a['value'], how_to_process=how)
-
-    # apply some filters on the data.
-    # TODO extract into own function with additional filters popping up over time
-    for a in author_data:
-        if min_date is not None:
-            min_date_timestamp = datetime.datetime.strptime(min_date, '%Y-%m-%d').timestamp()
-            not_too_old_idx = a['date'] >= min_date_timestamp
-            a['date'] = a['date'][not_too_old_idx]
-            a['date_str'] = a['date_str'][not_too_old_idx]
-            a['citations'] = a['citations'][not_too_old_idx]
-            a['h_index'] = a['h_index'][not_too_old_idx]
-            a['i10_index'] = a['i10_index'][not_too_old_idx]
-            a['value'] = a['value'][not_too_old_idx]
-            
-        if max_date is not None:
-            max_date_timestamp = datetime.datetime.strptime(max_date, '%Y-%m-%d').timestamp()
-            not_too_new_idx = a['date'] <= max_date_timestamp
-            a['date'] = a['date'][not_too_new_idx]
-            a['date_str'] = a['date_str'][not_too_new_idx]
-            a['citations'] = a['citations'][not_too_new_idx]
-            a['h_index'] = a['h_index'][not_too_new_idx]
-            a['i10_index'] = a['i10_index'][not_too_new_idx]
-            a['value'] = a['value'][not_too_new_idx]
-
-    # draw plots
+    # select, process and filter the data, then draw plots
+    author_data = select_process_and_filter_values(author_data, what, how, min_date, max_date)
     fig = plt.figure(figsize=(figsize, figsize))
-    for a in author_data:
-        p = plt.plot(
-            a['date'],
-            a['value'],
-            #marker='s', #make this optional
-            label='{} ({})'.format(a['name'], a['scholar_id'])
-        )
-        a['plot_color'] = p[0].get_color()
-
-    for a in author_data:
-        plt.text(x=a['date'][-1],
-                 y=a['value'][-1],
-                 s='{} ->'.format(hows_format[how].format(a['value'][-1])),
-                 color=a['plot_color'],
-                 backgroundcolor=[1,1,1,0.5],
-                 va='center', 
-                 ha='right')
-
-    # define decoration
-    # TODO better way to figure out x-ticks to select and show. parameter? see commented code below.
-    tick_indices    = np.linspace(start=0,
-                              stop=len(author_data[0]['date'])-1,
-                              num=num_xticks,
-                              dtype=int) #assume all dates align
-    x_ticks         = author_data[0]['date'][tick_indices]
-    x_tick_labels   = author_data[0]['date_str'][tick_indices]
-
+    draw_author_data(fig, author_data, what, how, fontsize, num_xticks)
 
     # TODO show or safe.
-    plt.xticks(x_ticks, x_tick_labels, rotation=45, ha='center',fontsize=fontsize)
-    plt.yticks(fontsize=fontsize)
-    plt.ylabel(how,fontsize=fontsize)
-    plt.xlabel('date',fontsize=fontsize)
-    plt.title('{} {}'.format(whats_keys[what], how))
-
-    plt.legend(fontsize=fontsize)
     plt.show()
 
 
@@ -226,5 +163,89 @@ def plot(authors, author_list, author_record_dir, output_file, list, show, what,
 
 
 
+
+def select_process_and_filter_values(author_data, what, how, min_date=None, max_date=None):
+    # selects the measurements to visualize ("what") as the "value" field of each author, processes
+    # them as desired ("how") and applies date filters on all time series fields.
+
+    # select desired measurements as values to be visualized ("what")
+    for a in author_data:
+        a['value'] = a[whats_keys[what]]
+
+    # process values as desired ("how")
+    for a in author_data:
+        a['value'] = process_values(a['value'], how_to_process=how)
+
+    # apply some filters on the data.
+    # TODO additional filters popping up over time go here
+    for a in author_data:
+        if min_date is not None:
+            min_date_timestamp = datetime.datetime.strptime(min_date, '%Y-%m-%d').timestamp()
+            not_too_old_idx = a['date'] >= min_date_timestamp
+            a['date'] = a['date'][not_too_old_idx]
+            a['date_str'] = a['date_str'][not_too_old_idx]
+            a['citations'] = a['citations'][not_too_old_idx]
+            a['h_index'] = a['h_index'][not_too_old_idx]
+            a['i10_index'] = a['i10_index'][not_too_old_idx]
+            a['value'] = a['value'][not_too_old_idx]
+            
+        if max_date is not None:
+            max_date_timestamp = datetime.datetime.strptime(max_date, '%Y-%m-%d').timestamp()
+            not_too_new_idx = a['date'] <= max_date_timestamp
+            a['date'] = a['date'][not_too_new_idx]
+            a['date_str'] = a['date_str'][not_too_new_idx]
+            a['citations'] = a['citations'][not_too_new_idx]
+            a['h_index'] = a['h_index'][not_too_new_idx]
+            a['i10_index'] = a['i10_index'][not_too_new_idx]
+            a['value'] = a['value'][not_too_new_idx]
+
+    return author_data
+
+
+def draw_author_data(fig, author_data, what, how, fontsize, num_xticks):
+    # draws the (selected, processed and filtered) author data into the given figure.
+    # only the figure's own axes are used, such that this also works outside of pyplot's global state.
+    ax = fig.add_subplot(1, 1, 1)
+
+    # draw plots
+    for a in author_data:
+        p = ax.plot(
+            a['date'],
+            a['value'],
+            #marker='s', #make this optional
+            label='{} ({})'.format(a['name'], a['scholar_id'])
+        )
+        a['plot_color'] = p[0].get_color()
+
+    for a in author_data:
+        ax.text(x=a['date'][-1],
+                y=a['value'][-1],
+                s='{} ->'.format(hows_format[how].format(a['value'][-1])),
+                color=a['plot_color'],
+                backgroundcolor=[1,1,1,0.5],
+                va='center', 
+                ha='right')
+
+    # define decoration
+    # TODO better way to figure out x-ticks to select and show. parameter? see the commented out load_and_plot above.
+    tick_indices    = np.linspace(start=0,
+                              stop=len(author_data[0]['date'])-1,
+                              num=num_xticks,
+                              dtype=int) #assume all dates align
+    x_ticks         = author_data[0]['date'][tick_indices]
+    x_tick_labels   = author_data[0]['date_str'][tick_indices]
+
+    ax.set_xticks(x_ticks)
+    ax.set_xticklabels(x_tick_labels, rotation=45, ha='center',fontsize=fontsize)
+    ax.tick_params(axis='y', labelsize=fontsize)
+    ax.set_ylabel(how,fontsize=fontsize)
+    ax.set_xlabel('date',fontsize=fontsize)
+    ax.set_title('{} {}'.format(whats_keys[what], how))
+
+    ax.legend(fontsize=fontsize)
+    return fig
+
+
+
 if __name__ == '__main__':
     plot()
\ No newline at end of file
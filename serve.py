@@ -0,0 +1,337 @@
+import io
+import os
+import json
+import math
+import click
+import datetime
+import threading
+import collections
+import urllib.parse
+from tqdm import tqdm
+from termcolor import colored
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from matplotlib.figure import Figure
+
+from util import load_single_author_data, desparsify_time_series_data
+from plot import whats, hows, select_process_and_filter_values, draw_author_data
+
+
+
+##############
+# DATA CACHES
+##############
+
+class LRUCache:
+    """ A small thread safe least-recently-used cache of bounded size """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+def copy_author_blob(a):
+    # shallow copy of an author's data, with copied time series arrays such that in-place manipulations
+    # by desparsify_time_series_data and friends do not leak back into the cached data.
+    return {k: (v.copy() if hasattr(v, 'copy') else v) for k, v in a.items()}
+
+
+class AuthorDataStore:
+    """
+        Keeps the parsed author records of a directory in memory. Files are re-parsed only if their
+        modification time or size has changed since the last refresh. Desparsified data is cached
+        per selection of authors and invalidated implicitly via the files' signatures.
+    """
+
+    def __init__(self, author_record_dir, cache_size=128):
+        self.author_record_dir = author_record_dir
+        self.records = {}       # scholar_id -> (signature, parsed author data)
+        self.failed = {}        # scholar_id -> signature of the file which could not be parsed
+        self.lock = threading.Lock()
+        self.desparsified = LRUCache(cache_size)
+
+    def refresh(self, author_ids=None):
+        # (re)loads the given authors' files, or all files in the directory if no authors are given,
+        # if they are new or have changed. returns the currently available data of these authors.
+        if author_ids is None:
+            author_ids = [os.path.splitext(x)[0] for x in os.listdir(self.author_record_dir) if x.endswith('.txt')]
+            with self.lock:
+                for author_id in set(self.records) - set(author_ids):
+                    del self.records[author_id] # file has been removed
+                for author_id in set(self.failed) - set(author_ids):
+                    del self.failed[author_id]
+
+        for author_id in author_ids:
+            self.refresh_author(author_id)
+        with self.lock:
+            return {a: self.records[a] for a in author_ids if a in self.records}
+
+    def refresh_author(self, author_id):
+        # checks a single author's file for changes and (re)loads it if necessary.
+        # the file is parsed without holding the lock, such that other requests are not blocked meanwhile.
+        if author_id != os.path.basename(author_id) or author_id.startswith('.'):
+            return # not a plain file name within the author record directory
+        path = os.path.join(self.author_record_dir, author_id + '.txt')
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.records.pop(author_id, None) # file has been removed
+                self.failed.pop(author_id, None)
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            if author_id in self.records and self.records[author_id][0] == signature:
+                return
+            if self.failed.get(author_id) == signature:
+                return # still broken. only retry once the file changes again.
+
+        try:
+            author_data = load_single_author_data(author_id, self.author_record_dir)
+            if author_data['date'].size == 0:
+                raise ValueError('no recorded data') # desparsify_time_series_data needs at least one record
+        except Exception as e:
+            # e.g. a partially appended line while main.py writes to the file. keep serving the
+            # last good data, and remember the broken state such that only a changed file is retried.
+            tqdm.write(colored('WARNING! Could not load author data from "{}": {}'.format(path, e), 'yellow'))
+            with self.lock:
+                self.failed[author_id] = signature
+            return
+
+        with self.lock:
+            if author_id in self.records and self.records[author_id][0][0] > signature[0]:
+                return # a concurrent request has already loaded a newer state of the file
+            self.records[author_id] = (signature, author_data)
+            self.failed.pop(author_id, None)
+
+    def authors(self):
+        # returns a dict of scholar_id -> (name, affiliation) of all available authors.
+        records = self.refresh()
+        return {k: (v[1]['name'], v[1]['affiliation']) for k, v in records.items()}
+
+    def get(self, author_ids):
+        # returns the desparsified data of the given authors as fresh copies, which may be manipulated freely.
+        # returns the signature of the selection as a second value, which identifies the current state of the data.
+        records = self.refresh(author_ids)
+        missing = [a for a in author_ids if a not in records]
+        if missing:
+            raise KeyError(missing)
+
+        signature = tuple((a, records[a][0]) for a in author_ids)
+        author_data = self.desparsified.get(signature)
+        if author_data is None:
+            author_data = desparsify_time_series_data([copy_author_blob(records[a][1]) for a in author_ids])
+            self.desparsified.put(signature, author_data)
+        return [copy_author_blob(a) for a in author_data], signature
+
+
+
+
+##############
+# HTTP SERVICE
+##############
+
+class RequestError(Exception):
+    """ An error caused by invalid request parameters, to be answered with the given http status """
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_series_parameters(query):
+    # reads and validates the parameters shared by the /series and /plot.png end points.
+    authors = tuple(a.strip() for a in query.get('authors', []) if len(a.strip()) > 0)
+    if not authors:
+        raise RequestError(400, 'at least one parameter "authors" is required')
+
+    what = query.get('what', [whats[0]])[-1]
+    how = query.get('how', [hows[0]])[-1]
+    if what not in whats:
+        raise RequestError(400, 'invalid value "{}" for "what". all options: {}'.format(what, whats))
+    if how not in hows:
+        raise RequestError(400, 'invalid value "{}" for "how". all options: {}'.format(how, hows))
+
+    min_date = query.get('min_date', [None])[-1]
+    max_date = query.get('max_date', [None])[-1]
+    for d in [min_date, max_date]:
+        if d is not None:
+            try:
+                datetime.datetime.strptime(d, '%Y-%m-%d')
+            except ValueError:
+                raise RequestError(400, 'invalid date "{}". dates are to be given in %Y-%m-%d format.'.format(d))
+    return authors, what, how, min_date, max_date
+
+
+def finite_or_none(values):
+    # growth values are infinite wherever the past value is 0, e.g. for authors padded with zeros by
+    # desparsify_time_series_data. json has no representation for those, so they become null.
+    return [v if math.isfinite(v) else None for v in values.tolist()]
+
+
+def parse_int_parameter(query, name, default, minimum, maximum):
+    # reads an integer parameter within [minimum, maximum]. the bounds keep broken or overly large plots from being rendered.
+    try:
+        value = int(query.get(name, [default])[-1])
+    except ValueError:
+        raise RequestError(400, 'parameter "{}" must be an integer'.format(name))
+    if not minimum <= value <= maximum:
+        raise RequestError(400, 'parameter "{}" must be within [{}, {}]'.format(name, minimum, maximum))
+    return value
+
+
+class PlotRequestHandler(BaseHTTPRequestHandler):
+    """
+        Answers GET requests on the end points
+            /authors    : all available authors as json
+            /series     : the processed time series data of the selected authors as json
+            /plot.png   : the plotted time series data of the selected authors as png
+        Time series parameters are given as query parameters named after the options of plot.py,
+        e.g. /plot.png?authors=wpLQuroAAAAJ&authors=7aQwO08AAAAJ&what=cited&how=delta_month&min_date=2021-01-01
+    """
+
+    # set by make_server
+    store = None
+    png_cache = None
+    render_lock = threading.Lock()
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        handlers = {'/authors': self.get_authors,
+                    '/series': self.get_series,
+                    '/plot.png': self.get_plot}
+        try:
+            if url.path not in handlers:
+                raise RequestError(404, 'unknown path "{}". available: {}'.format(url.path, list(handlers)))
+            content_type, body = handlers[url.path](query)
+        except RequestError as e:
+            self.send_json(e.status, {'error': str(e)})
+            return
+        except Exception as e:
+            tqdm.write(colored('ERROR! Failed to answer request "{}": {}'.format(self.path, e), 'red'))
+            self.send_json(500, {'error': str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, obj):
+        body = json.dumps(obj, allow_nan=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        tqdm.write('{} - {}'.format(self.address_string(), format % args))
+
+    def load_series(self, query):
+        authors, what, how, min_date, max_date = parse_series_parameters(query)
+        try:
+            author_data, signature = self.store.get(authors)
+        except KeyError as e:
+            raise RequestError(404, 'no recorded author data available for {}'.format(e.args[0]))
+        author_data = select_process_and_filter_values(author_data, what, how, min_date, max_date)
+        if any(a['date'].size == 0 for a in author_data):
+            raise RequestError(404, 'no recorded author data available within the given date range')
+        return author_data, signature
+
+    def get_authors(self, query):
+        authors = self.store.authors()
+        body = [{'scholar_id': k, 'name': v[0], 'affiliation': v[1]} for k, v in sorted(authors.items())]
+        return 'application/json', json.dumps(body, allow_nan=False).encode('utf-8')
+
+    def get_series(self, query):
+        author_data, _ = self.load_series(query)
+        body = [{'scholar_id'   : a['scholar_id'],
+                 'name'         : a['name'],
+                 'affiliation'  : a['affiliation'],
+                 'date_str'     : a['date_str'].tolist(),
+                 'value'        : finite_or_none(a['value'])} for a in author_data]
+        return 'application/json', json.dumps(body, allow_nan=False).encode('utf-8')
+
+    def get_plot(self, query):
+        authors, what, how, min_date, max_date = parse_series_parameters(query)
+        figsize = parse_int_parameter(query, 'figsize', 5, minimum=1, maximum=30)
+        fontsize = parse_int_parameter(query, 'fontsize', 8, minimum=1, maximum=72)
+        num_xticks = parse_int_parameter(query, 'num_xticks', 5, minimum=1, maximum=100)
+
+        # the file signatures are part of the key, such that updated data is never served from stale images.
+        author_data, signature = self.load_series(query)
+        key = (signature, what, how, min_date, max_date, figsize, fontsize, num_xticks)
+        body = self.png_cache.get(key)
+        if body is None:
+            # matplotlib is not thread safe. use a plain Figure outside of pyplot and render one at a time.
+            with self.render_lock:
+                fig = Figure(figsize=(figsize, figsize))
+                draw_author_data(fig, author_data, what, how, fontsize, num_xticks)
+                buffer = io.BytesIO()
+                fig.savefig(buffer, format='png')
+            body = buffer.getvalue()
+            self.png_cache.put(key, body)
+        return 'image/png', body
+
+
+def make_server(author_record_dir, host='localhost', port=8000, cache_size=128):
+    # creates a threaded http server answering requests from the author data in author_record_dir.
+    # port 0 selects an arbitrary free port, which can be read from server.server_address.
+    store = AuthorDataStore(author_record_dir, cache_size=cache_size)
+    store.refresh() # warm up
+    handler = type('BoundPlotRequestHandler', (PlotRequestHandler,), {'store': store, 'png_cache': LRUCache(cache_size)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+
+
+##############
+# ENTRY POINT
+##############
+
+@click.command()
+@click.option('--author_record_dir' , '-ad' , default='./output/authors/'   , help="Should point at the folder containing all the pre-collected author data.")
+@click.option('--host'              , '-H'  , default='localhost'           , help="The host name or address to serve on.")
+@click.option('--port'              , '-p'  , default=8000                  , help="The port to serve on.")
+@click.option('--cache_size'        , '-cs' , default=128                   , help="Number of desparsified author selections and rendered plots to keep in memory.")
+def serve(author_record_dir, host, port, cache_size):
+    """
+        This script serves (already downloaded) author information from the disc via http,
+        as time series json data (/series) and plots (/plot.png). Author data is kept in memory
+        and only changed files are reloaded.
+    """
+
+    # announce current time
+    tqdm.write(colored('Data service starting at {}'.format(datetime.datetime.now()), 'green'))
+
+    server = make_server(author_record_dir, host=host, port=port, cache_size=cache_size)
+    tqdm.write('Serving author data from "{}" on http://{}:{}'.format(author_record_dir, *server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    serve()
@@ -172,42 +172,40 @@ def load_author_data(author_ids, directory):
     # loads the data of an author as given via author_id (google scholar id), expected to be found in directory,
     # and returns it as a dictionary aligned to the list of authors in author_ids
     # we can already assume that the target file exists, given a previous call to check_if_data_available_for
-
-    author_data = []
-    for a in author_ids:
-        author_file = '{}/{}.txt'.format(directory, a.strip())
-        with open(author_file) as f:
-            # read data and prepare some fields for time series
-            lines = f.read().replace('#','').strip().split('\n')
-            name, affiliation = lines[0].split(',',1)
-            date = []
-            citations = []
-            h_index = []
-            i10_index = []
-
-            # now read the actual data.
-            for line in lines[2::]:
-                d,c,h,i = line.split()
-                date.append(d)
-                citations.append(int(c))
-                h_index.append(0 if h == 'none' else int(h))
-                i10_index.append(0 if i == 'none' else int(i))
-
-            # package everything
-            author_blob = {
-                        'name'          : name,
-                        'affiliation'   : affiliation,
-                        'scholar_id'    : a,
-                        'date'          :  np.array([datetime.datetime.strptime(di, '%Y-%m-%d').timestamp() for di in date]),
-                        'date_str'      :  np.array(date),
-                        'citations'     :  np.array(citations),
-                        'h_index'       :  np.array(h_index),
-                        'i10_index'     :  np.array(i10_index)
-                        }
-            author_data.append(author_blob)
-
-    # return the read data.
-    return author_data
+    return [load_single_author_data(a, directory) for a in author_ids]
+
+
+def load_single_author_data(author_id, directory):
+    # loads and parses the record file of a single author, as given via author_id (google scholar id).
+    author_file = '{}/{}.txt'.format(directory, author_id.strip())
+    with open(author_file) as f:
+        # read data and prepare some fields for time series
+        lines = f.read().replace('#','').strip().split('\n')
+        name, affiliation = lines[0].split(',',1)
+        date = []
+        citations = []
+        h_index = []
+        i10_index = []
+
+        # now read the actual data.
+        for line in lines[2::]:
+            d,c,h,i = line.split()
+            date.append(d)
+            citations.append(int(c))
+            h_index.append(0 if h == 'none' else int(h))
+            i10_index.append(0 if i == 'none' else int(i))
+
+    # package everything
+    return {
+            'name'          : name,
+            'affiliation'   : affiliation,
+            'scholar_id'    : author_id,
+            'date'          :  np.array([datetime.datetime.strptime(di, '%Y-%m-%d').timestamp() for di in date]),
+            'date_str'      :  np.array(date),
+            'citations'     :  np.array(citations),
+            'h_index'       :  np.array(h_index),
+            'i10_index'     :  np.array(i10_index)
+            }
 
 
 def desparsify_time_series_data(author_data, filters={}):